@@ -4,6 +4,8 @@ import sqlite3
 from datetime import datetime, date
 import plotly.express as px
 import hashlib
+import io
+import itertools
 
 # -------------------------------------
 # Database config
@@ -11,11 +13,47 @@ import hashlib
 DB = 'finance_app.db'
 DEFAULT_CATEGORIES = ["Food", "Transport", "Health", "Entertainment", "Other"]
 
-def connect_db():
-    return sqlite3.connect(DB, check_same_thread=False)
-
-def init_db():
-    conn = connect_db()
+def _tune(conn: sqlite3.Connection) -> None:
+    # Per-connection tunings; WAL/synchronous are set on the writer only
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-64000")
+
+@st.cache_resource
+def get_pool():
+    """One write connection plus a small cycle of read-only connections.
+
+    Under WAL, readers neither block nor are blocked by the writer, so
+    routing reads through their own connections keeps dashboard queries
+    from serializing behind inserts on a single shared handle.
+    """
+    # Autocommit mode: single-row writes commit immediately, and multi-
+    # statement operations take an explicit BEGIN IMMEDIATE instead of
+    # relying on the driver's implicit transaction handling.
+    rw = sqlite3.connect(DB, check_same_thread=False, isolation_level=None)
+    # WAL lets readers run concurrently with writers; NORMAL sync halves
+    # the fsyncs per commit.
+    rw.execute("PRAGMA journal_mode=WAL")
+    rw.execute("PRAGMA synchronous=NORMAL")
+    _tune(rw)
+    readers = []
+    for _ in range(4):
+        r = sqlite3.connect(f"file:{DB}?mode=ro", uri=True, check_same_thread=False)
+        r.execute("PRAGMA query_only=1")
+        _tune(r)
+        readers.append(r)
+    return rw, itertools.cycle(readers)
+
+def get_conn() -> sqlite3.Connection:
+    """Write connection (also used for DDL at startup)."""
+    return get_pool()[0]
+
+def get_read_conn() -> sqlite3.Connection:
+    """Round-robin read-only connection."""
+    return next(get_pool()[1])
+
+def _init_db():
+    conn = get_conn()
     c = conn.cursor()
 
     # Users with password hash
@@ -49,132 +87,236 @@ def init_db():
         PRIMARY KEY(username, category)
     )''')
 
-    conn.commit()
-    conn.close()
+    # Expense lookups always filter by username, then date or category
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exp_user_date ON expenses(username, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exp_user_cat ON expenses(username, category)")
+
+@st.cache_resource
+def init_db():
+    """Run the schema setup once per process; later reruns hit the cache."""
+    _init_db()
+    return True
 
 # -------------------------------------
 # Auth Helpers
 # -------------------------------------
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password: str) -> bytes:
+    # Raw digest (stored as BLOB) skips the hex round-trip
+    return hashlib.sha256(password.encode()).digest()
 
 def signup_user(username: str, password: str) -> bool:
-    conn = connect_db()
+    conn = get_conn()
     c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
     try:
         c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hash_password(password)))
-        # add default categories
-        for cat in DEFAULT_CATEGORIES:
-            c.execute("INSERT OR IGNORE INTO categories (username, category) VALUES (?, ?)", (username, cat))
-        conn.commit()
+        # add default categories in one batch
+        c.executemany(
+            "INSERT OR IGNORE INTO categories (username, category) VALUES (?, ?)",
+            [(username, cat) for cat in DEFAULT_CATEGORIES]
+        )
+        c.execute("COMMIT")
+        get_categories.clear()
         ok = True
     except sqlite3.IntegrityError:
+        c.execute("ROLLBACK")
         ok = False
-    conn.close()
+    except Exception:
+        # Leave no transaction open on the shared writer connection
+        c.execute("ROLLBACK")
+        raise
     return ok
 
 def login_user(username: str, password: str) -> bool:
-    conn = connect_db()
+    # Single indexed PK lookup; the digest comparison happens in SQLite
+    conn = get_read_conn()
     c = conn.cursor()
-    c.execute("SELECT password FROM users WHERE username = ?", (username,))
-    row = c.fetchone()
-    conn.close()
-    if row and row[0] == hash_password(password):
-        return True
-    return False
-
-def user_exists(username: str) -> bool:
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM users WHERE username=?", (username,))
-    row = c.fetchone()
-    conn.close()
-    return row is not None
+    c.execute("SELECT 1 FROM users WHERE username = ? AND password = ?", (username, hash_password(password)))
+    return c.fetchone() is not None
 
 # -------------------------------------
 # Categories
 # -------------------------------------
+@st.cache_data(ttl=300, show_spinner=False)
 def get_categories(username: str) -> pd.DataFrame:
-    conn = connect_db()
+    conn = get_read_conn()
     df = pd.read_sql_query("SELECT category FROM categories WHERE username = ? ORDER BY category", conn, params=(username,))
-    conn.close()
     return df
 
 def add_category(username: str, category: str) -> bool:
     if not category:
         return False
-    conn = connect_db()
+    conn = get_conn()
     c = conn.cursor()
     try:
         c.execute("INSERT INTO categories (username, category) VALUES (?, ?)", (username, category.strip()))
-        conn.commit()
+        get_categories.clear()
         ok = True
     except sqlite3.IntegrityError:
         ok = False
-    conn.close()
     return ok
 
 def delete_category(username: str, category: str) -> None:
-    conn = connect_db()
+    conn = get_conn()
     c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM expenses WHERE username=? AND category=?", (username, category))
-    exp_count = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM budget WHERE username=? AND category=?", (username, category))
-    bud_count = c.fetchone()[0]
-    if exp_count == 0 and bud_count == 0:
-        c.execute("DELETE FROM categories WHERE username=? AND category=?", (username, category))
-        conn.commit()
-    conn.close()
+    deleted = False
+    # BEGIN IMMEDIATE keeps the in-use checks and the delete atomic
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        # EXISTS stops at the first matching row instead of counting them all
+        c.execute("SELECT EXISTS(SELECT 1 FROM expenses WHERE username=? AND category=? LIMIT 1)", (username, category))
+        in_expenses = c.fetchone()[0]
+        c.execute("SELECT EXISTS(SELECT 1 FROM budget WHERE username=? AND category=? LIMIT 1)", (username, category))
+        in_budget = c.fetchone()[0]
+        if not in_expenses and not in_budget:
+            c.execute("DELETE FROM categories WHERE username=? AND category=?", (username, category))
+            deleted = True
+        c.execute("COMMIT")
+    except Exception:
+        c.execute("ROLLBACK")
+        raise
+    if deleted:
+        get_categories.clear()
 
 # -------------------------------------
 # Expenses
 # -------------------------------------
 def add_expense(username, date_str, category, amount, description):
-    conn = connect_db()
+    conn = get_conn()
     c = conn.cursor()
     c.execute(
         "INSERT INTO expenses (username, date, category, amount, description) VALUES (?, ?, ?, ?, ?)",
         (username, date_str, category, float(amount), description.strip())
     )
-    conn.commit()
-    conn.close()
+    get_expenses.clear()
+    get_recent_expenses.clear()
+    get_month_stats.clear()
+    get_budget_overview.clear()
+    build_category_pie.clear()
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_expenses(username) -> pd.DataFrame:
-    conn = connect_db()
+    conn = get_read_conn()
     df = pd.read_sql_query(
         "SELECT id, date, category, amount, description FROM expenses WHERE username = ?",
-        conn, params=(username,)
+        conn, params=(username,), parse_dates=['date']
+    )
+    return df
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_recent_expenses(username: str, limit: int = 100) -> pd.DataFrame:
+    """Most recent expenses only, so widgets stay constant-size."""
+    conn = get_read_conn()
+    df = pd.read_sql_query(
+        "SELECT id, date, category, amount FROM expenses WHERE username = ? ORDER BY id DESC LIMIT ?",
+        conn, params=(username, limit)
+    )
+    return df
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_month_stats(username: str, ym: str) -> tuple:
+    """(month total, average daily spend) for one month, aggregated in SQL."""
+    c = get_read_conn().execute(
+        "SELECT COALESCE(SUM(day_total), 0), COALESCE(AVG(day_total), 0) FROM "
+        "(SELECT SUM(amount) AS day_total FROM expenses WHERE username = ? AND date LIKE ? GROUP BY date)",
+        (username, ym + '%')
+    )
+    return c.fetchone()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_budget_overview(username: str, ym: str) -> pd.DataFrame:
+    """Budget limits joined against the month's per-category spend in SQL."""
+    conn = get_read_conn()
+    df = pd.read_sql_query(
+        "SELECT b.category, b.monthly_limit, COALESCE(e.spent, 0) AS amount "
+        "FROM budget b "
+        "LEFT JOIN (SELECT category, SUM(amount) AS spent FROM expenses "
+        "           WHERE username = ? AND date LIKE ? GROUP BY category) e "
+        "  ON e.category = b.category "
+        "WHERE b.username = ?",
+        conn, params=(username, ym + '%', username)
     )
-    conn.close()
     return df
 
+@st.cache_data(ttl=300, show_spinner=False)
+def build_category_pie(username: str):
+    """All-time spending-by-category pie, rebuilt only when expenses change."""
+    totals = pd.read_sql_query(
+        "SELECT category, SUM(amount) AS amount FROM expenses WHERE username = ? GROUP BY category",
+        get_read_conn(), params=(username,)
+    )
+    return px.pie(totals, values='amount', names='category', title='Spending by Category')
+
+def add_expenses_bulk(username: str, df: pd.DataFrame) -> int:
+    """Insert many expenses in one transaction (CSV import path).
+
+    Raises ValueError if any date or amount is missing or invalid.
+    """
+    if df.empty:
+        return 0
+    # The month aggregates match on ISO 'YYYY-MM-DD' text, so normalize
+    # whatever date format the CSV used before inserting. Blank cells come
+    # through as NaT/NaN rather than raising, and would bind as NULL —
+    # reject those explicitly.
+    dates = pd.to_datetime(df['date'], errors='raise')
+    if dates.isna().any():
+        raise ValueError("missing or blank dates")
+    amounts = pd.to_numeric(df['amount'], errors='coerce')
+    if amounts.isna().any():
+        raise ValueError("missing or non-numeric amounts")
+    rows = [
+        (username, d, str(cat), float(amt), str(desc))
+        for d, cat, amt, desc in zip(dates.dt.strftime('%Y-%m-%d'), df['category'], amounts, df['description'])
+    ]
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.executemany(
+            "INSERT INTO expenses (username, date, category, amount, description) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        c.execute("COMMIT")
+    except Exception:
+        c.execute("ROLLBACK")
+        raise
+    get_expenses.clear()
+    get_recent_expenses.clear()
+    get_month_stats.clear()
+    get_budget_overview.clear()
+    build_category_pie.clear()
+    return len(rows)
+
 def delete_expense(expense_id: int):
-    conn = connect_db()
+    conn = get_conn()
     c = conn.cursor()
     c.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-    conn.commit()
-    conn.close()
+    get_expenses.clear()
+    get_recent_expenses.clear()
+    get_month_stats.clear()
+    get_budget_overview.clear()
+    build_category_pie.clear()
 
 # -------------------------------------
 # Budgets
 # -------------------------------------
 def set_budget(username, category, limit):
-    conn = connect_db()
+    conn = get_conn()
     c = conn.cursor()
     c.execute(
         "INSERT OR REPLACE INTO budget (username, category, monthly_limit) VALUES (?, ?, ?)",
         (username, category, float(limit))
     )
-    conn.commit()
-    conn.close()
+    get_budget.clear()
+    get_budget_overview.clear()
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_budget(username) -> pd.DataFrame:
-    conn = connect_db()
+    conn = get_read_conn()
     df = pd.read_sql_query(
         "SELECT category, monthly_limit FROM budget WHERE username = ?",
         conn, params=(username,)
     )
-    conn.close()
     return df
 
 # -------------------------------------
@@ -183,14 +325,6 @@ def get_budget(username) -> pd.DataFrame:
 def current_month_key(dt: datetime) -> str:
     return dt.strftime('%Y-%m')
 
-def month_filter(df: pd.DataFrame, dt: datetime) -> pd.DataFrame:
-    if df.empty:
-        return df
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'])
-    key = current_month_key(dt)
-    return df[df['date'].dt.strftime('%Y-%m') == key]
-
 def format_inr(x: float) -> str:
     return f"₹{x:,.2f}"
 
@@ -228,13 +362,10 @@ def main():
             if st.button("Create Account"):
                 if not new_user or not new_pass:
                     st.error("Please fill both fields.")
-                elif user_exists(new_user):
-                    st.warning("Username already exists, choose another.")
+                elif signup_user(new_user, new_pass):
+                    st.success("Account created! Please log in.")
                 else:
-                    if signup_user(new_user, new_pass):
-                        st.success("Account created! Please log in.")
-                    else:
-                        st.error("Failed to create account.")
+                    st.warning("Username already exists, choose another.")
         return
 
     # If logged in
@@ -266,12 +397,8 @@ def from_finance_app(username: str):
         if exp_df.empty:
             st.info("No data yet. Add some expenses in the 'Add Expense' tab!")
         else:
-            exp_df_local = exp_df.copy()
-            exp_df_local['date'] = pd.to_datetime(exp_df_local['date'])
-            month_expenses = month_filter(exp_df_local, datetime.now())
-
-            total = float(month_expenses['amount'].sum()) if not month_expenses.empty else 0.0
-            daily_avg = month_expenses.groupby(month_expenses['date'].dt.date)['amount'].sum().mean() if not month_expenses.empty else 0.0
+            ym = current_month_key(datetime.now())
+            total, daily_avg = get_month_stats(username, ym)
 
             c1, c2 = st.columns(2)
             c1.metric("📅 Total This Month", format_inr(total))
@@ -279,17 +406,17 @@ def from_finance_app(username: str):
 
             # Budget alerts + overview
             if not bud_df.empty:
-                spent_by_cat = month_expenses.groupby('category')['amount'].sum().reset_index() if not month_expenses.empty else pd.DataFrame(columns=['category','amount'])
-                merged = pd.merge(bud_df, spent_by_cat, on='category', how='left').fillna({'amount': 0.0})
-                merged['status'] = merged['amount'] / merged['monthly_limit']
-                for _, row in merged.iterrows():
-                    if row['monthly_limit'] <= 0:
-                        continue
-                    if row['status'] > 1:
-                        st.warning(f"🚨 Over budget in {row['category']}: {format_inr(row['amount'])}/{format_inr(row['monthly_limit'])}")
-                    elif row['status'] > 0.8:
-                        st.info(f"⚠️ Almost at limit for {row['category']}: {format_inr(row['amount'])}/{format_inr(row['monthly_limit'])}")
-                st.dataframe(merged[['category','monthly_limit','amount']].rename(columns={'monthly_limit':'Monthly Limit','amount':'Spent'}))
+                merged = get_budget_overview(username, ym)
+                merged['status'] = merged['amount'] / merged['monthly_limit'].where(merged['monthly_limit'] > 0)
+                over = merged[merged['status'] > 1]
+                near = merged[(merged['status'] > 0.8) & (merged['status'] <= 1)]
+                for r in over.itertuples(index=False):
+                    st.warning(f"🚨 Over budget in {r.category}: {format_inr(r.amount)}/{format_inr(r.monthly_limit)}")
+                for r in near.itertuples(index=False):
+                    st.info(f"⚠️ Almost at limit for {r.category}: {format_inr(r.amount)}/{format_inr(r.monthly_limit)}")
+                overview = merged[['category','monthly_limit','amount']].rename(columns={'monthly_limit':'Monthly Limit','amount':'Spent'})
+                # Format currency at render time instead of per-row Python calls
+                st.dataframe(overview.style.format({'Monthly Limit': '₹{:,.2f}', 'Spent': '₹{:,.2f}'}))
 
     # ---------------- Add Expense ----------------
     with tab_add:
@@ -325,24 +452,44 @@ def from_finance_app(username: str):
         if df.empty:
             st.warning("No data to show.")
         else:
-            df['date'] = pd.to_datetime(df['date'])
             with st.expander("🗂 View Table"):
                 st.dataframe(df.sort_values('date', ascending=False))
             with st.expander("🗑 Delete Expense"):
-                del_id = st.selectbox("Select Expense ID", options=df['id'].tolist())
+                recent = get_recent_expenses(username)
+                labels = {
+                    f"#{r.id} {r.date} {r.category} {format_inr(r.amount)}": r.id
+                    for r in recent.itertuples(index=False)
+                }
+                choice = st.selectbox("Select Expense (last 100)", options=list(labels))
                 if st.button("Delete Expense"):
-                    delete_expense(int(del_id))
+                    delete_expense(int(labels[choice]))
                     st.success("Deleted!")
-            pie = px.pie(df, values='amount', names='category', title='Spending by Category')
-            st.plotly_chart(pie, use_container_width=True)
+            st.plotly_chart(build_category_pie(username), use_container_width=True)
 
     # ---------------- Import/Export ----------------
     with tab_io:
         st.subheader("📤 Export / 📥 Import")
         df = get_expenses(username)
         if not df.empty:
-            csv = df.to_csv(index=False).encode()
-            st.download_button("Download Expenses", csv, file_name=f"{username}_expenses.csv", mime='text/csv')
+            # Write straight into a bytes buffer; skips the str -> bytes encode copy
+            buf = io.BytesIO()
+            df.to_csv(buf, index=False)
+            buf.seek(0)
+            st.download_button("Download Expenses", buf, file_name=f"{username}_expenses.csv", mime='text/csv')
+
+        uploaded = st.file_uploader("Import Expenses (CSV with date, category, amount, description)", type="csv")
+        if uploaded is not None:
+            imp_df = pd.read_csv(uploaded)
+            required = {'date', 'category', 'amount', 'description'}
+            if not required.issubset(imp_df.columns):
+                st.error(f"CSV must contain columns: {', '.join(sorted(required))}")
+            elif st.button("📥 Import"):
+                try:
+                    n = add_expenses_bulk(username, imp_df[['date', 'category', 'amount', 'description']])
+                except ValueError as e:
+                    st.error(f"Import failed: {e}. Use YYYY-MM-DD dates and numeric amounts.")
+                else:
+                    st.success(f"Imported {n} expenses!")
 
 
 if __name__ == "__main__":